@@ -1,13 +1,28 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import fitz                 # PyMuPDF
-import docx                 # python-docx
+import pypdfium2 as pdfium  # pypdfium2
+from lxml import etree      # lxml
 from fpdf import FPDF       # fpdf2
 import google.generativeai as genai
-import textwrap, io, pathlib
+import io, pathlib
 import os
+import zipfile
+import functools
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from datetime import datetime
 import re
 from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from xml.sax.saxutils import escape
 from io import BytesIO
 
 # ─── Configuration ────────────────────────────────────────────────────────────
@@ -18,9 +33,36 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ─── Text Patterns ────────────────────────────────────────────────────────────
+_RE_SPACES = re.compile(r' +')
+_RE_WORD = re.compile(r'\S+')
+# Question sections run from an indicator heading up to the next markdown heading, short
+# "Heading:" line, or bold/numbered heading ending in a colon (e.g. "**7. Other:**"); the
+# latter must end at the colon so items like "1. **Role:** Which title?" don't stop the scan
+_RE_QSECTION = re.compile(
+    r'(?i:missing information|information needed|questions|additional details|clarification needed)'
+    r'[^\n]*\n(.*?)'
+    r'(?=\n(?:\#{1,6}[ \t]'
+    r'|[ \t]*(?:\*\*)?(?:\d+\.[ \t]*)?(?:\*\*)?[A-Z][^\n]{0,40}:(?:\*\*)?[ \t]*(?:\n|\Z)'
+    r'|[A-Z][^\n]{0,40}:)|\Z)',
+    re.S
+)
+# A lone "*" is a bullet; "**" opens bold text such as a heading
+_RE_QITEM = re.compile(r'(?m)^\s*(?:[-•]|\*(?!\*)|\d+[.)])\s*(.{11,}?)\s*$')
+
 # ─── API Setup ────────────────────────────────────────────────────────────────
+GEMINI_MODEL = "gemini-1.5-flash"
+
+@st.cache_resource(show_spinner=False)
+def _load_gemini_models(api_key: str):
+    """Configure Gemini once per API key and return the analysis and rewrite models"""
+    genai.configure(api_key=api_key)  # type: ignore[reportPrivateImportUsage]
+    analysis_model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=ANALYSIS_INSTRUCTIONS)  # type: ignore[reportPrivateImportUsage]
+    rewrite_model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=REWRITE_INSTRUCTIONS)  # type: ignore[reportPrivateImportUsage]
+    return analysis_model, rewrite_model
+
 def setup_gemini():
-    """Setup Gemini API with proper error handling"""
+    """Setup Gemini API with proper error handling; returns (analysis_model, rewrite_model)"""
     api_key = None
     
     # Try multiple sources for API key
@@ -48,49 +90,155 @@ def setup_gemini():
         if not api_key:
             st.stop()
     try:
-        genai.configure(api_key=api_key)  # type: ignore[reportPrivateImportUsage]
-        model = genai.GenerativeModel("gemini-1.5-flash")  # type: ignore[reportPrivateImportUsage]
-        return model
+        return _load_gemini_models(api_key)
     except Exception as e:
         st.error(f"Failed to initialize Gemini: {str(e)}")
         st.stop()
 
 # ─── Helper Functions ─────────────────────────────────────────────────────────
+def _extract_pdf_text_pdfium(data: bytes) -> str:
+    """Extract text from all PDF pages with pdfium's range-based extractor"""
+    pdf = pdfium.PdfDocument(data)
+    try:
+        return _normalize_stream(_iter_pdfium_pages(pdf))
+    finally:
+        pdf.close()
+
+def _iter_pdfium_pages(pdf):
+    """Yield the text of each pdfium page, closing pages as they are consumed"""
+    for page in pdf:
+        textpage = page.get_textpage()
+        try:
+            yield textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+
+def _extract_pdf_text_mupdf(data: bytes) -> str:
+    """Extract text from all PDF pages with MuPDF"""
+    # PyMuPDF runs MuPDF without locking and holds the GIL, so pages are read sequentially
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        return _normalize_stream(doc.load_page(i).get_text("text") for i in range(doc.page_count))  # type: ignore
+    finally:
+        doc.close()
+
+@st.cache_resource(show_spinner=False)
+def _pdf_lock() -> threading.Lock:
+    """Process-wide lock serializing PDF parsing"""
+    # Neither PDFium nor MuPDF (as set up by PyMuPDF) is thread-safe, and extraction runs
+    # on background threads for every session. Cached so reruns don't create a new lock.
+    return threading.Lock()
+
 def extract_text_from_pdf(uploaded_file) -> str:
     """Extract text from PDF file with error handling"""
     try:
-        # Use explicit page loading to avoid linter error
-        doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-        text = "\n".join(doc.load_page(i).get_text("text") for i in range(doc.page_count))  # type: ignore
-        doc.close()
-        return text
+        # getvalue() hands back the upload's own bytes without copying or moving the stream
+        data = uploaded_file.getvalue()
+        with _pdf_lock():
+            try:
+                return _extract_pdf_text_pdfium(data)
+            except Exception:
+                # Fall back to MuPDF for files pdfium cannot open (e.g. some encrypted PDFs)
+                return _extract_pdf_text_mupdf(data)
     except Exception as e:
         st.error(f"Error reading PDF: {str(e)}")
         return ""
 
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_T, _W_TAB, _W_BR, _W_CR = (f"{_W_NS}{tag}" for tag in ("p", "t", "tab", "br", "cr"))
+# Tabs and breaks inside runs render as characters, as in python-docx's Paragraph.text
+_W_RUN_CHARS = {_W_TAB: "\t", _W_BR: "\n", _W_CR: "\n"}
+_DOCX_XML_PARSER = etree.XMLParser(resolve_entities=False)
+# Word stores text boxes twice: in mc:Choice and again in mc:Fallback for older readers
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+def _iter_docx_paragraphs(elements):
+    """Yield the text of every paragraph once, text-box paragraphs after their anchor"""
+    for element in elements:
+        if element.tag == _MC_FALLBACK:
+            continue
+        if element.tag == _W_P:
+            parts, nested = [], []
+            _collect_docx_runs(element, parts, nested)
+            yield "".join(parts)
+            yield from _iter_docx_paragraphs(nested)
+        else:
+            yield from _iter_docx_paragraphs(element)
+
+def _collect_docx_runs(element, parts: list, nested: list) -> None:
+    """Gather a paragraph's own text, setting aside paragraphs nested in text boxes"""
+    for child in element:
+        if child.tag == _MC_FALLBACK:
+            continue
+        if child.tag == _W_P:
+            nested.append(child)
+        elif child.tag == _W_T:
+            parts.append(child.text or "")
+        elif child.tag in _W_RUN_CHARS:
+            parts.append(_W_RUN_CHARS[child.tag])
+        else:
+            _collect_docx_runs(child, parts, nested)
+
 def extract_text_from_docx(uploaded_file) -> str:
     """Extract text from DOCX file with error handling"""
     try:
-        doc = docx.Document(uploaded_file)
-        return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+        # Walk the document XML once instead of building python-docx wrapper objects
+        with zipfile.ZipFile(uploaded_file) as archive:
+            tree = etree.fromstring(archive.read("word/document.xml"), _DOCX_XML_PARSER)
+        # Rewind so the upload can be read again
+        uploaded_file.seek(0)
+        return _normalize_stream(_iter_docx_paragraphs([tree]))
     except Exception as e:
         st.error(f"Error reading DOCX: {str(e)}")
         return ""
 
-def clean_text(text: str) -> str:
-    """Clean and normalize extracted text"""
-    # Remove excessive whitespace
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    text = re.sub(r' +', ' ', text)
-    return text.strip()
+def _normalize_stream(chunks) -> str:
+    """Clean and normalize text chunks while writing them into a single buffer"""
+    buffer = io.StringIO()
+    prev_blank = True  # Drop leading blank lines
+    for chunk in chunks:
+        lines = chunk.splitlines()
+        # Chunks are line-separated, so an empty or newline-terminated chunk ends in a blank line
+        if not chunk or chunk[-1] in '\r\n':
+            lines.append('')
+        for line in lines:
+            # Collapse space runs and trailing whitespace; keep at most one blank line
+            line = _RE_SPACES.sub(' ', line).rstrip()
+            if line:
+                buffer.write(line)
+                buffer.write('\n')
+                prev_blank = False
+            elif not prev_blank:
+                buffer.write('\n')
+                prev_blank = True
+    return buffer.getvalue().strip()
 
-def build_analysis_prompt(resume_text: str) -> str:
-    """Build comprehensive analysis prompt"""
-    return f"""
-You are a professional resume analyst and career coach. Analyze the following resume comprehensively:
+@st.cache_resource(show_spinner=False)
+def _background_pool() -> ThreadPoolExecutor:
+    """Shared worker pool for work started ahead of user actions"""
+    return ThreadPoolExecutor(max_workers=4)
 
-RESUME TEXT:
-{resume_text}
+@st.cache_resource(show_spinner=False)
+def _draft_pool() -> ThreadPoolExecutor:
+    """Separate pool for speculative rewrites so slow API calls never delay text extraction"""
+    return ThreadPoolExecutor(max_workers=4)
+
+def extract_resume_text(uploaded_file, ctx=None) -> str:
+    """Extract normalized text from an uploaded PDF or DOCX file"""
+    # Attach the session's script context so errors still reach the page from a worker thread
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    if uploaded_file.type == "application/pdf":
+        resume_text = extract_text_from_pdf(uploaded_file)
+    else:
+        resume_text = extract_text_from_docx(uploaded_file)
+    return resume_text
+
+# Static instructions are sent once as the model's system instruction so
+# each request only carries the resume-specific content
+ANALYSIS_INSTRUCTIONS = """
+You are a professional resume analyst and career coach. Analyze the resume provided by the user comprehensively.
 
 ANALYSIS REQUIREMENTS:
 1. Overall Score (0-100) with justification
@@ -103,8 +251,30 @@ ANALYSIS REQUIREMENTS:
 Format your response clearly with headers for each section.
 """
 
+REWRITE_INSTRUCTIONS = """
+You are an expert resume writer. Using the information provided by the user, create a complete, professional, and ATS-friendly resume.
+- Use all available details from the original resume and the user's answers.
+- If any section is missing or incomplete, intelligently fill in the gaps with realistic, relevant content based on the candidate's background and the target industry.
+- Improve clarity, phrasing, and formatting throughout.
+- Do NOT include placeholders or incomplete sections.
+- Return ONLY the finished resume, no commentary.
+
+REQUIREMENTS:
+- Use strong action verbs
+- Quantify achievements where possible
+- Ensure proper formatting and structure
+- Include relevant keywords for ATS
+"""
+
+def build_analysis_prompt(resume_text: str) -> str:
+    """Build the per-resume part of the analysis prompt"""
+    return f"""
+RESUME TEXT:
+{resume_text}
+"""
+
 def build_rewrite_prompt(resume_text: str, extra_info: str, style_preferences: dict) -> str:
-    """Build rewrite prompt with style preferences and instruct AI to fill in gaps intelligently"""
+    """Build the per-resume part of the rewrite prompt with style preferences"""
     style_guide = f"""
 STYLE PREFERENCES:
 - Format: {style_preferences['format']}
@@ -114,13 +284,6 @@ STYLE PREFERENCES:
 """
     
     return f"""
-You are an expert resume writer. Using the information below, create a complete, professional, and ATS-friendly resume.
-- Use all available details from the original resume and the user's answers.
-- If any section is missing or incomplete, intelligently fill in the gaps with realistic, relevant content based on the candidate's background and the target industry.
-- Improve clarity, phrasing, and formatting throughout.
-- Do NOT include placeholders or incomplete sections.
-- Return ONLY the finished resume, no commentary.
-
 {style_guide}
 
 EXISTING RESUME:
@@ -129,24 +292,250 @@ EXISTING RESUME:
 ADDITIONAL INFORMATION FROM USER:
 {extra_info}
 
-REQUIREMENTS:
-- Use strong action verbs
-- Quantify achievements where possible
-- Ensure proper formatting and structure
-- Include relevant keywords for ATS
-
 RESUME:
 """
 
+def build_batch_analysis_prompt(resume_texts: list) -> str:
+    """Build a single prompt that analyzes several resumes at once"""
+    resumes = "\n<SEP>\n".join(
+        f"RESUME_{i}:\n{text}" for i, text in enumerate(resume_texts, start=1)
+    )
+    return f"""
+Return a JSON list of exactly {len(resume_texts)} strings, one per resume below and in the same order.
+Each string must contain the complete analysis of that resume, formatted with headers for each section.
+
+{resumes}
+"""
+
+# ─── Semantic Cache ───────────────────────────────────────────────────────────
+EMBEDDING_MODEL = "models/text-embedding-004"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+class SemanticCache:
+    """In-memory cache that returns stored responses for near-duplicate texts"""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: list[np.ndarray] = []
+        self._values: list[str] = []
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding: np.ndarray) -> str | None:
+        """Return the response of the most similar entry above the threshold"""
+        with self._lock:
+            if not self._vectors:
+                return None
+            # Vectors are unit length, so the dot product is the cosine similarity
+            similarities = np.stack(self._vectors) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self._values[best]
+        return None
+
+    def add(self, embedding: np.ndarray, value: str) -> None:
+        """Store a response, evicting the oldest entry when full"""
+        if not value:
+            return
+        with self._lock:
+            self._vectors.append(embedding)
+            self._values.append(value)
+            if len(self._vectors) > self.max_entries:
+                del self._vectors[0], self._values[0]
+
+def _semantic_cache() -> SemanticCache:
+    """Semantic cache for the current browser session"""
+    # Scoped per session so one user's near-duplicate resume never returns another user's analysis
+    if "_semantic_cache" not in st.session_state:
+        st.session_state["_semantic_cache"] = SemanticCache()
+    return st.session_state["_semantic_cache"]
+
+def _embed_text(text: str) -> np.ndarray | None:
+    """Embed text as a unit vector, or return None if embedding fails"""
+    try:
+        result = genai.embed_content(  # type: ignore[reportPrivateImportUsage]
+            model=EMBEDDING_MODEL,
+            content=text,
+            task_type="semantic_similarity"
+        )
+        vector = np.asarray(result["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    except Exception:
+        return None
+
+# ─── Disk Cache ───────────────────────────────────────────────────────────────
+DISK_CACHE_PATH = pathlib.Path(__file__).with_name("resumes.db")
+DISK_CACHE_TTL = 30 * 86400  # Seconds a persisted response stays valid
+
+@st.cache_resource(show_spinner=False)
+def _disk_cache_path() -> pathlib.Path:
+    """Create the on-disk response cache table once and return its path"""
+    with closing(sqlite3.connect(DISK_CACHE_PATH)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, ts INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_ts ON cache (ts)")
+    return DISK_CACHE_PATH
+
+def _disk_cache_key(instructions: str, prompt: str) -> str:
+    """Key a response by model, system instruction and prompt"""
+    return _hash_text(GEMINI_MODEL + instructions + prompt)
+
+def _disk_cache_get(key: str) -> str | None:
+    """Return a persisted response, or None on a miss or unreadable cache"""
+    try:
+        with closing(sqlite3.connect(_disk_cache_path())) as conn:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND ts >= ?",
+                (key, int(time.time()) - DISK_CACHE_TTL)
+            ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+def _disk_cache_put(key: str, value: str) -> None:
+    """Persist a response and evict expired ones; failures only cost a future cache miss"""
+    now = int(time.time())
+    try:
+        with closing(sqlite3.connect(_disk_cache_path())) as conn, conn:
+            conn.execute("DELETE FROM cache WHERE ts < ?", (now - DISK_CACHE_TTL,))
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now))
+    except sqlite3.Error:
+        pass
+
+# ─── Gemini Calls ─────────────────────────────────────────────────────────────
+def _hash_text(text: str) -> str:
+    """Return the SHA-256 hex digest used as a cache key for text content"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _generate(model, instructions: str, prompt: str) -> str:
+    """Generate a response without rendering it; safe to run off the script thread"""
+    key = _disk_cache_key(instructions, prompt)
+    cached = _disk_cache_get(key)
+    if cached is not None:
+        return cached
+    text = model.generate_content(prompt).text or ""
+    if not text:
+        raise ValueError("Gemini returned an empty response")
+    _disk_cache_put(key, text)
+    return text
+
+def _stream_generate(model, instructions: str, prompt: str) -> str:
+    """Generate a response, rendering chunks as they arrive; responses persist across sessions"""
+    key = _disk_cache_key(instructions, prompt)
+    cached = _disk_cache_get(key)
+    if cached is not None:
+        return cached
+    stream = model.generate_content(prompt, stream=True)
+    # Chunks without parts (e.g. a bare finish reason) carry no text
+    text = st.write_stream(chunk.text for chunk in stream if chunk.parts) or ""
+    # Raising keeps empty (e.g. safety-blocked) replies out of st.cache_data and the disk cache
+    if not text:
+        raise ValueError("Gemini returned an empty response")
+    _disk_cache_put(key, text)
+    return text
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _cached_analyze(_model, resume_hash: str, _prompt: str) -> str:
+    """Generate an analysis, cached by resume content hash"""
+    return _stream_generate(_model, ANALYSIS_INSTRUCTIONS, _prompt)
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _cached_rewrite(_model, resume_hash: str, extra_info: str, style_key: str, _prompt: str) -> str:
+    """Generate an enhanced resume, cached by resume hash, answers and style"""
+    return _stream_generate(_model, REWRITE_INSTRUCTIONS, _prompt)
+
+def analyze_resume(model, resume_text: str) -> str:
+    """Analyze a resume, reusing earlier responses for identical or near-duplicate text"""
+    prompt = build_analysis_prompt(resume_text)
+    embedding = None
+    # Every memoized analysis is also persisted, so a disk miss means the exact layers miss;
+    # only then fall back to this session's near-duplicates. Approximate hits are returned
+    # here and never stored under the exact hash, so they stay private to the session.
+    if _disk_cache_get(_disk_cache_key(ANALYSIS_INSTRUCTIONS, prompt)) is None:
+        embedding = _embed_text(resume_text)
+        if embedding is not None:
+            cached = _semantic_cache().lookup(embedding)
+            if cached is not None:
+                return cached
+    analysis = _cached_analyze(model, _hash_text(resume_text), prompt)
+    if embedding is not None:
+        _semantic_cache().add(embedding, analysis)
+    return analysis
+
+# Rough upper bound on batched prompt size (~4 characters per token)
+BATCH_TOKEN_LIMIT = 900_000
+# The model's output cap, not its input window, limits how many analyses fit in one reply
+BATCH_OUTPUT_TOKEN_LIMIT = 8192
+ANALYSIS_OUTPUT_TOKENS = 1500  # Typical length of a single analysis
+BATCH_MAX_RESUMES = BATCH_OUTPUT_TOKEN_LIMIT // ANALYSIS_OUTPUT_TOKENS
+
+def _analysis_batches(resume_texts: list):
+    """Group resumes into batches whose prompts and replies fit the model's limits"""
+    batch, batch_tokens = [], 0
+    for text in resume_texts:
+        tokens = len(text) // 4
+        if batch and (len(batch) >= BATCH_MAX_RESUMES or batch_tokens + tokens > BATCH_TOKEN_LIMIT):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def analyze_resumes(model, resume_texts: list) -> list:
+    """Analyze several resumes in batched requests, falling back to one request per resume"""
+    # Only resumes without a persisted analysis are sent to the model
+    misses = [
+        text for text in dict.fromkeys(resume_texts)
+        if _disk_cache_get(_disk_cache_key(ANALYSIS_INSTRUCTIONS, build_analysis_prompt(text))) is None
+    ]
+    for batch in _analysis_batches(misses):
+        if len(batch) < 2:
+            continue
+        try:
+            response = model.generate_content(
+                build_batch_analysis_prompt(batch),
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "max_output_tokens": BATCH_OUTPUT_TOKEN_LIMIT
+                }
+            )
+            analyses = json.loads(response.text)
+            if (isinstance(analyses, list) and len(analyses) == len(batch)
+                    and all(isinstance(analysis, str) and analysis for analysis in analyses)):
+                for text, analysis in zip(batch, analyses):
+                    _disk_cache_put(_disk_cache_key(ANALYSIS_INSTRUCTIONS, build_analysis_prompt(text)), analysis)
+        except Exception:
+            pass  # Malformed or failed batch; its resumes are analyzed individually below
+    # Batched results are now on disk, so this only calls the model for resumes a batch missed
+    return [analyze_resume(model, text) for text in resume_texts]
+
+def rewrite_resume(model, resume_text: str, extra_info: str, style_preferences: dict) -> str:
+    """Rewrite a resume, reusing earlier responses for identical inputs"""
+    style_key = json.dumps(style_preferences, sort_keys=True)
+    prompt = build_rewrite_prompt(resume_text, extra_info, style_preferences)
+    return _cached_rewrite(model, _hash_text(resume_text), extra_info, style_key, prompt)
+
+def _rewrite_key(resume_text: str, style_preferences: dict) -> tuple:
+    """Identify the inputs of a rewrite made without user answers"""
+    return _hash_text(resume_text), json.dumps(style_preferences, sort_keys=True)
+
+def start_speculative_rewrite(model, resume_text: str, style_preferences: dict) -> tuple:
+    """Start a rewrite without user answers in the background; returns (key, future)"""
+    # Even if the draft is never used, its response lands in the disk cache
+    prompt = build_rewrite_prompt(resume_text, "", style_preferences)
+    future = _draft_pool().submit(_generate, model, REWRITE_INSTRUCTIONS, prompt)
+    return _rewrite_key(resume_text, style_preferences), future
+
 def create_pdf_from_text(resume_text: str, filename: str = "resume") -> bytes:
     """Create PDF with better formatting and error handling"""
     try:
         pdf = FPDF()
         pdf.set_auto_page_break(auto=True, margin=15)
         pdf.add_page()
-        # Add DejaVuSans font (Unicode)
-        pdf.add_font("DejaVu", "", "DejaVuSans.ttf", uni=True)
-        pdf.add_font("DejaVu", "B", "DejaVuSans-Bold.ttf", uni=True)
+        # Add DejaVuSans font (Unicode); fonts are subset in place on output, so never share them
+        pdf.add_font("DejaVu", "", "DejaVuSans.ttf")
+        pdf.add_font("DejaVu", "B", "DejaVuSans-Bold.ttf")
         pdf.set_font("DejaVu", size=11)
         lines = resume_text.split('\n')
         usable_width = pdf.w - 2 * pdf.l_margin  # Safe width for multicell
@@ -157,14 +546,12 @@ def create_pdf_from_text(resume_text: str, filename: str = "resume") -> bytes:
                 if line.isupper() or line.endswith(':'):
                     pdf.set_font("DejaVu", style='B', size=12)
                     pdf.ln(2)
-                    # Wrap long lines, break long words
-                    wrapped = textwrap.fill(line, width=90, break_long_words=True)
-                    pdf.multi_cell(usable_width, 6, wrapped)
+                    # multi_cell wraps to the cell width itself, breaking long words as needed
+                    pdf.multi_cell(usable_width, 6, line, new_x="LMARGIN", new_y="NEXT")
                     pdf.ln(1)
                 else:
                     pdf.set_font("DejaVu", size=10)
-                    wrapped = textwrap.fill(line, width=90, break_long_words=True)
-                    pdf.multi_cell(usable_width, 5, wrapped)
+                    pdf.multi_cell(usable_width, 5, line, new_x="LMARGIN", new_y="NEXT")
             else:
                 pdf.ln(3)
         # Output PDF as bytes using dest='S'. Handle both str and bytearray return types.
@@ -181,47 +568,34 @@ def create_pdf_from_text(resume_text: str, filename: str = "resume") -> bytes:
 def create_docx_from_text(resume_text: str, filename: str = "resume") -> bytes:
     """Create a DOCX file from resume text and return as bytes."""
     doc = Document()
-    for line in resume_text.split('\n'):
-        if line.strip() == "":
-            doc.add_paragraph()  # Blank line
-        else:
-            doc.add_paragraph(line)
+    # Build all paragraphs as one XML fragment instead of one add_paragraph call per line
+    paragraphs = "".join(
+        '<w:p/>' if line.strip() == "" else  # Blank line
+        '<w:p><w:r><w:t xml:space="preserve">'
+        + escape(line).replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">')
+        + '</w:t></w:r></w:p>'
+        for line in resume_text.split('\n')
+    )
+    fragment = parse_xml(f'<w:body {nsdecls("w")}>{paragraphs}</w:body>')
+    # Paragraphs must precede the trailing section properties
+    body = doc.element.body
+    index = body.index(body.sectPr) if body.sectPr is not None else len(body)
+    body[index:index] = list(fragment)
     file_stream = BytesIO()
     doc.save(file_stream)
     file_stream.seek(0)
     return file_stream.read()
 
+@st.cache_data(ttl=86400, max_entries=64, show_spinner=False)
+def _cached_docx(resume_hash: str, _resume_text: str) -> bytes:
+    """Build DOCX bytes once per enhanced resume"""
+    return create_docx_from_text(_resume_text)
+
 def extract_questions_from_analysis(analysis_text: str) -> list:
     """Extract questions from analysis with improved parsing"""
     questions = []
-    lines = analysis_text.split('\n')
-    
-    # Look for common question indicators
-    question_indicators = [
-        "missing information", "information needed", "questions",
-        "additional details", "clarification needed"
-    ]
-    
-    in_question_section = False
-    for line in lines:
-        line_lower = line.lower().strip()
-        
-        # Check if we're entering a question section
-        if any(indicator in line_lower for indicator in question_indicators):
-            in_question_section = True
-            continue
-        
-        # Stop at next major section
-        if in_question_section and line.strip() and not line.startswith((' ', '-', '•', '1', '2', '3', '4', '5')):
-            if ':' in line and len(line.split(':')[0].split()) < 4:
-                in_question_section = False
-        
-        # Extract questions
-        if in_question_section and line.strip():
-            # Clean up question text
-            question = re.sub(r'^[-•\d\.\s]+', '', line).strip()
-            if question and len(question) > 10:  # Filter out too short lines
-                questions.append(question)
+    for section in _RE_QSECTION.finditer(analysis_text):
+        questions.extend(_RE_QITEM.findall(section.group(1)))
     
     # Fallback questions if none found
     if not questions:
@@ -240,7 +614,7 @@ def main():
     st.markdown("Transform your resume with AI analysis and optimization")
     
     # Initialize Gemini
-    model = setup_gemini()
+    analysis_model, rewrite_model = setup_gemini()
     
     # Sidebar for settings
     with st.sidebar:
@@ -291,6 +665,35 @@ def main():
         st.info("👆 Upload your resume file(s) to get started")
         return
     
+    # Start extracting every upload in the background so parsing overlaps with rendering
+    for uploaded_file in uploaded_files:
+        future_key = f"text_future_{uploaded_file.file_id}"
+        if future_key not in st.session_state:
+            st.session_state[future_key] = _background_pool().submit(
+                extract_resume_text, uploaded_file, get_script_run_ctx()
+            )
+    
+    # Analyze all uploads with a single batched request
+    if len(uploaded_files) > 1 and st.button("🔍 Analyze All Resumes", key="analyze_all", type="primary"):
+        with st.spinner("🤖 AI is analyzing your resumes..."):
+            try:
+                pending = []
+                for idx, uploaded_file in enumerate(uploaded_files):
+                    resume_text = st.session_state[f"text_future_{uploaded_file.file_id}"].result()
+                    if resume_text:
+                        pending.append((f"analysis_{idx}_{uploaded_file.name}", resume_text))
+                        st.session_state[f"speculative_rewrite_{idx}"] = start_speculative_rewrite(
+                            rewrite_model, resume_text, style_preferences
+                        )
+                stream_area = st.empty()
+                with stream_area.container():
+                    analyses = analyze_resumes(analysis_model, [text for _, text in pending])
+                stream_area.empty()
+                for (analysis_key, _), analysis in zip(pending, analyses):
+                    st.session_state[analysis_key] = analysis
+            except Exception as e:
+                st.error(f"Analysis failed: {str(e)}")
+    
     # Process each uploaded file
     for idx, uploaded_file in enumerate(uploaded_files):
         with st.container():
@@ -302,12 +705,7 @@ def main():
             with col1:
                 # Extract text
                 with st.spinner("Extracting text..."):
-                    if uploaded_file.type == "application/pdf":
-                        resume_text = extract_text_from_pdf(uploaded_file)
-                    else:
-                        resume_text = extract_text_from_docx(uploaded_file)
-                    
-                    resume_text = clean_text(resume_text)
+                    resume_text = st.session_state[f"text_future_{uploaded_file.file_id}"].result()
                 
                 if not resume_text:
                     st.error("Could not extract text from file")
@@ -324,17 +722,25 @@ def main():
             
             with col2:
                 st.metric("Characters", len(resume_text))
-                st.metric("Words", len(resume_text.split()))
-                st.metric("Lines", len(resume_text.split('\n')))
+                # Count without materializing word and line lists
+                st.metric("Words", sum(1 for _ in _RE_WORD.finditer(resume_text)))
+                st.metric("Lines", resume_text.count('\n') + 1)
             
             # Analysis section
             analysis_key = f"analysis_{idx}_{uploaded_file.name}"
             
             if st.button(f"🔍 Analyze Resume", key=f"analyze_{idx}", type="primary"):
+                # Draft a rewrite without answers while the analysis streams
+                st.session_state[f"speculative_rewrite_{idx}"] = start_speculative_rewrite(
+                    rewrite_model, resume_text, style_preferences
+                )
                 with st.spinner("🤖 AI is analyzing your resume..."):
                     try:
-                        analysis_response = model.generate_content(build_analysis_prompt(resume_text))
-                        st.session_state[analysis_key] = analysis_response.text
+                        # Stream into a placeholder; the finished analysis is rendered below
+                        stream_area = st.empty()
+                        with stream_area.container():
+                            st.session_state[analysis_key] = analyze_resume(analysis_model, resume_text)
+                        stream_area.empty()
                     except Exception as e:
                         st.error(f"Analysis failed: {str(e)}")
             
@@ -379,59 +785,73 @@ def main():
                         if answer:
                             processed_answers.append(f"Q: {question}\nA: {answer}")
                     
-                    if not processed_answers:
-                        st.warning("Please provide at least one answer to improve your resume.")
-                    else:
-                        extra_info = "\n\n".join(processed_answers)
-                        
-                        with st.spinner("🎯 Creating your enhanced resume..."):
-                            try:
-                                if model is None:
-                                    st.error("Gemini API client not initialized. Check your API key.")
-                                else:
-                                    enhanced_response = model.generate_content(build_rewrite_prompt(resume_text, extra_info, style_preferences))
-                                    enhanced_resume = enhanced_response.text or ""
+                    # Unanswered questions are filled in by the AI
+                    extra_info = "\n\n".join(processed_answers)
+                    speculative = st.session_state.pop(f"speculative_rewrite_{idx}", None)
+                    
+                    with st.spinner("🎯 Creating your enhanced resume..."):
+                        try:
+                            if rewrite_model is None:
+                                st.error("Gemini API client not initialized. Check your API key.")
+                            else:
+                                speculative_key = _rewrite_key(resume_text, style_preferences)
+                                enhanced_resume = ""
+                                draft = speculative[1] if speculative else None
+                                # Use a matching draft only once it has started; a draft still queued
+                                # behind other sessions' work would be slower than streaming a fresh one
+                                if (draft and not extra_info and speculative[0] == speculative_key
+                                        and (draft.done() or draft.running())):
+                                    try:
+                                        enhanced_resume = draft.result()
+                                    except Exception:
+                                        pass  # A failed draft only means generating the rewrite now
+                                elif draft:
+                                    draft.cancel()
+                                if not enhanced_resume:
+                                    stream_area = st.empty()
+                                    with stream_area.container():
+                                        enhanced_resume = rewrite_resume(rewrite_model, resume_text, extra_info, style_preferences)
+                                    stream_area.empty()
+                            
+                            if enhanced_resume:
+                                # Success message and download
+                                st.success("✅ Enhanced resume created successfully!")
                                 
-                                # Create DOCX
-                                docx_bytes = create_docx_from_text(enhanced_resume)
+                                # Create filename with timestamp
+                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                                filename = f"Enhanced_Resume_{timestamp}.docx"
                                 
-                                if docx_bytes:
-                                    # Success message and download
-                                    st.success("✅ Enhanced resume created successfully!")
-                                    
-                                    # Create filename with timestamp
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                    filename = f"Enhanced_Resume_{timestamp}.docx"
-                                    
-                                    col1, col2 = st.columns(2)
-                                    with col1:
-                                        st.download_button(
-                                            "📥 Download Enhanced Resume (DOCX)",
-                                            data=docx_bytes,
-                                            file_name=filename,
-                                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                            type="primary",
-                                            use_container_width=True
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    st.download_button(
+                                        "📥 Download Enhanced Resume (DOCX)",
+                                        # DOCX is only built when the button is clicked
+                                        data=functools.partial(_cached_docx, _hash_text(enhanced_resume), enhanced_resume),
+                                        file_name=filename,
+                                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                                        on_click="ignore",
+                                        type="primary",
+                                        use_container_width=True
+                                    )
+                                
+                                with col2:
+                                    if st.button("👀 Preview Enhanced Resume", key=f"preview_{idx}"):
+                                        st.session_state[f"show_preview_{idx}"] = True
+                                
+                                # Show preview if requested
+                                if st.session_state.get(f"show_preview_{idx}", False):
+                                    with st.expander("📄 Enhanced Resume Preview", expanded=True):
+                                        st.text_area(
+                                            "Enhanced Resume",
+                                            enhanced_resume,
+                                            height=400,
+                                            disabled=True
                                         )
-                                    
-                                    with col2:
-                                        if st.button("👀 Preview Enhanced Resume", key=f"preview_{idx}"):
-                                            st.session_state[f"show_preview_{idx}"] = True
-                                    
-                                    # Show preview if requested
-                                    if st.session_state.get(f"show_preview_{idx}", False):
-                                        with st.expander("📄 Enhanced Resume Preview", expanded=True):
-                                            st.text_area(
-                                                "Enhanced Resume",
-                                                enhanced_resume,
-                                                height=400,
-                                                disabled=True
-                                            )
-                                else:
-                                    st.error("Failed to create DOCX. Please try again.")
-                                    
-                            except Exception as e:
-                                st.error(f"Enhancement failed: {str(e)}")
+                            else:
+                                st.error("Failed to create enhanced resume. Please try again.")
+                                
+                        except Exception as e:
+                            st.error(f"Enhancement failed: {str(e)}")
             
             st.divider()
 